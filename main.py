@@ -9,6 +9,7 @@ import datetime
 from datetime import timedelta, timezone
 import asyncio
 import json
+import time
 
 # 載入環境變數
 load_dotenv()
@@ -52,23 +53,169 @@ MAX_HISTORY_LIMIT = 100 # 最大 100 則訊息
 MAX_SESSION_MESSAGES = 5000 # 單次錄製最大訊息量防呆 (防 OOM)
 
 CONFIG_FILE = "config.json"
-def load_allowed_roles():
+def load_config() -> dict:
     if os.path.exists(CONFIG_FILE):
         try:
             with open(CONFIG_FILE, "r", encoding="utf-8") as f:
                 data = json.load(f)
-                return data.get("allowed_role_ids", [])
+            # 最外層必須是物件，否則視為沒有設定
+            return data if isinstance(data, dict) else {}
         except json.JSONDecodeError:
             # 檔案存在但內容為空 (0 bytes) 時，視為沒有設定
-            return []
-    return []
+            return {}
+    return {}
+
+def load_allowed_roles():
+    return load_config().get("allowed_role_ids", [])
 
 def save_allowed_roles(role_ids):
+    # 保留設定檔中的其他欄位 (例如 summary_routing)
+    data = load_config()
+    data["allowed_role_ids"] = role_ids
     with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump({"allowed_role_ids": role_ids}, f, indent=4)
+        json.dump(data, f, indent=4)
 
 ALLOWED_ROLE_IDS = load_allowed_roles()
 
+# 摘要模型路由的預設策略 (可於 config.json 的 summary_routing 中以 "default" 或伺服器 ID 覆寫)
+DEFAULT_SUMMARY_ROUTING = {
+    "small_model": "gemini-3.1-flash-lite-preview", # 小範圍對話使用的輕量模型
+    "large_model": "gemini-3-flash-preview",        # 大範圍對話使用的大上下文模型
+    "fallback_models": ["gemini-2.5-flash"],        # 以上皆失敗時依序嘗試
+    "small_max_tokens": 8000,       # 預估輸入 (prompt) token 在此以下時優先使用輕量模型
+    "latency_budget_seconds": 20,   # 首選模型近期平均延遲超過此秒數時，改用較快的模型
+}
+
+# 各模型在各對話規模 ("small" / "large") 下近期的平均回應延遲 (秒)，以指數移動平均 (EMA) 記錄
+# 依規模分開記錄，避免大模型因多處理大範圍對話而被誤判為較慢
+model_latency = {}
+MODEL_LATENCY_ALPHA = 0.3
+# 輕量模型因延遲過高被換下後，每隔幾次小範圍摘要仍優先嘗試一次，讓其延遲紀錄有機會恢復
+SUMMARY_PROBE_EVERY = 10
+small_route_count = 0
+
+# 路由設定中各數值欄位的型別 (字串或浮點數會被轉換，轉換失敗或非正數則忽略)
+SUMMARY_ROUTING_NUMBER_KEYS = {
+    "small_max_tokens": int,
+    "latency_budget_seconds": float,
+}
+
+def validate_summary_routing(entry, source: str) -> dict:
+    """檢查並轉換單一路由設定，無效的欄位會被忽略並印出警告"""
+    if not isinstance(entry, dict):
+        print(f"⚠️ summary_routing 的 {source} 設定格式錯誤（應為物件），已改用預設值。")
+        return {}
+
+    valid = {}
+    for key, value in entry.items():
+        if key in ("small_model", "large_model"):
+            if isinstance(value, str) and value.strip():
+                valid[key] = value.strip()
+                continue
+        elif key == "fallback_models":
+            if isinstance(value, list) and all(isinstance(m, str) and m.strip() for m in value):
+                valid[key] = [m.strip() for m in value]
+                continue
+        elif key in SUMMARY_ROUTING_NUMBER_KEYS:
+            try:
+                number = SUMMARY_ROUTING_NUMBER_KEYS[key](float(value))
+            except (TypeError, ValueError, OverflowError):
+                number = None
+            if number is not None and number > 0 and not isinstance(value, bool):
+                valid[key] = number
+                continue
+        else:
+            print(f"⚠️ summary_routing 的 {source} 設定包含未知欄位 {key}，已忽略。")
+            continue
+        print(f"⚠️ summary_routing 的 {source} 設定中 {key} 的值 {value!r} 無效，已改用預設值。")
+    return valid
+
+# 已驗證的 summary_routing 設定，僅在 config.json 修改時間改變時重新讀取與驗證
+summary_routing_cache = {"mtime": None, "overrides": {}}
+
+def load_summary_routing_overrides() -> dict:
+    """讀取並驗證 config.json 中的 summary_routing，返回 {"default" 或伺服器 ID: 設定}"""
+    mtime = os.path.getmtime(CONFIG_FILE) if os.path.exists(CONFIG_FILE) else 0.0
+    if mtime == summary_routing_cache["mtime"]:
+        return summary_routing_cache["overrides"]
+
+    raw_overrides = load_config().get("summary_routing", {})
+    overrides = {}
+    if not isinstance(raw_overrides, dict):
+        print("⚠️ summary_routing 設定格式錯誤（應為物件），已改用預設值。")
+    else:
+        for key, entry in raw_overrides.items():
+            source = "default" if key == "default" else f"伺服器 {key}"
+            overrides[key] = validate_summary_routing(entry, source)
+
+    summary_routing_cache["mtime"] = mtime
+    summary_routing_cache["overrides"] = overrides
+    return overrides
+
+def load_summary_routing(guild_id=None) -> dict:
+    """取得指定伺服器的摘要模型路由設定 (預設值 ← default ← 伺服器設定)"""
+    routing = dict(DEFAULT_SUMMARY_ROUTING)
+    overrides = load_summary_routing_overrides()
+    routing.update(overrides.get("default", {}))
+    if guild_id is not None:
+        routing.update(overrides.get(str(guild_id), {}))
+    return routing
+
+# 啟動時先驗證一次，讓設定錯誤在開機時就顯示
+load_summary_routing_overrides()
+
+def estimate_tokens(text: str) -> int:
+    """粗估文字的 token 數 (中日韓文字約 1 字 1 token，其餘約 4 字元 1 token)"""
+    cjk_count = len(re.findall(r'[\u3000-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]', text))
+    return cjk_count + (len(text) - cjk_count) // 4
+
+def summary_size_bucket(prompt_tokens: int, routing: dict) -> str:
+    """依預估輸入 token 數判斷對話規模，返回 small 或 large"""
+    return "small" if prompt_tokens <= routing["small_max_tokens"] else "large"
+
+def choose_summary_models(prompt_tokens: int, routing: dict):
+    """依 prompt token 數與各模型近期延遲決定模型嘗試順序，返回 (模型清單, 路由原因)"""
+    global small_route_count
+    small_model = routing["small_model"]
+    large_model = routing["large_model"]
+
+    if summary_size_bucket(prompt_tokens, routing) == "small":
+        models = [small_model, large_model]
+        reason = f"小範圍（約 {prompt_tokens} tokens ≤ {routing['small_max_tokens']}）"
+
+        # 輕量模型在小範圍對話的近期延遲過高，且大模型在同規模下尚無紀錄 (值得一試) 或確實較快時，改用大模型
+        # 大範圍對話則一律不改用輕量模型
+        small_latency = model_latency.get((small_model, "small"))
+        large_latency = model_latency.get((large_model, "small"))
+        if (small_latency is not None and small_latency > routing["latency_budget_seconds"]
+                and (large_latency is None or large_latency < small_latency)):
+            small_route_count += 1
+            if small_route_count % SUMMARY_PROBE_EVERY == 0:
+                reason += f"，{small_model} 近期延遲 {small_latency:.1f} 秒，定期重新探測"
+            else:
+                reason += f"，{small_model} 近期延遲 {small_latency:.1f} 秒，改用 {large_model}"
+                models.reverse()
+    else:
+        models = [large_model, small_model]
+        reason = f"大範圍（約 {prompt_tokens} tokens > {routing['small_max_tokens']}）"
+
+    # 去除重複的模型 (例如 small_model 與 large_model 設為同一個)，避免失敗的模型被重複呼叫
+    models_to_try = []
+    for model_name in models + routing["fallback_models"]:
+        if model_name not in models_to_try:
+            models_to_try.append(model_name)
+
+    return models_to_try, reason
+
+def record_model_latency(model_name: str, size_bucket: str, seconds: float):
+    """更新模型在指定對話規模下的平均延遲紀錄"""
+    key = (model_name, size_bucket)
+    previous = model_latency.get(key)
+    if previous is None:
+        model_latency[key] = seconds
+    else:
+        model_latency[key] = MODEL_LATENCY_ALPHA * seconds + (1 - MODEL_LATENCY_ALPHA) * previous
+
 def process_message_content(message: discord.Message) -> dict:
     """處理單則訊息，轉換為紀錄用的字典格式"""
     content = message.content
@@ -153,10 +300,10 @@ async def check_timeout():
             await channel.send(f"⚠️ 偵測到閒置超過 {IDLE_TIMEOUT_MINUTES} 分鐘，自動停止錄製並存檔……")
             await save_and_stop(channel)
 
-async def generate_summary(channel_name, messages):
-    """使用 Gemini API 生成對話摘要"""
+async def generate_summary(channel_name, messages, guild_id=None):
+    """使用 Gemini API 生成對話摘要，返回 (摘要, 使用的模型, 路由原因)"""
     if not GEMINI_API_KEY:
-        return None, None
+        return None, None, None
 
     try:
         # 準備對話內容 (轉換為純文字)
@@ -169,7 +316,7 @@ async def generate_summary(channel_name, messages):
         
         # 避免送出空內容
         if not conversation_text.strip():
-            return None, None
+            return None, None, None
 
         # 設定 Prompt
         prompt = f"""
@@ -200,12 +347,16 @@ async def generate_summary(channel_name, messages):
         </conversation_log>
         """
 
-        # 定義模型優先順序
-        models_to_try = ['gemini-3-flash-preview', 'gemini-3.1-flash-lite-preview', 'gemini-2.5-flash']
+        # 依對話規模與近期延遲決定模型優先順序
+        routing = load_summary_routing(guild_id)
+        prompt_tokens = estimate_tokens(prompt)
+        size_bucket = summary_size_bucket(prompt_tokens, routing)
+        models_to_try, route_reason = choose_summary_models(prompt_tokens, routing)
         
         loop = asyncio.get_running_loop()
 
         for model_name in models_to_try:
+            started_at = time.monotonic()
             try:
                 # 呼叫 Gemini API (使用 run_in_executor 避免阻塞 Event Loop)
                 def generate(m=model_name):
@@ -215,19 +366,23 @@ async def generate_summary(channel_name, messages):
                     )
                 
                 response = await loop.run_in_executor(None, generate)
-                return response.text, model_name
+                record_model_latency(model_name, size_bucket, time.monotonic() - started_at)
+                return response.text, model_name, route_reason
                 
             except Exception as e:
+                # 失敗同樣計入延遲 (至少計為延遲預算的兩倍)，避免卡住或逾時的模型一直排在首位
+                elapsed = time.monotonic() - started_at
+                record_model_latency(model_name, size_bucket, max(elapsed, routing["latency_budget_seconds"] * 2))
                 print(f"⚠️ Model {model_name} failed: {e}")
                 continue # 嘗試下一個模型
         
         # 如果所有模型都失敗
         print("⚠️ All Gemini models failed to generate summary.")
-        return None, None
+        return None, None, None
 
     except Exception as e:
         print(f"Gemini API Error: {e}")
-        return None, None
+        return None, None, None
 
 async def save_and_stop(channel, target_channel=None, session_data=None):
     """執行停止錄製與存檔的共用邏輯"""
@@ -297,10 +452,10 @@ async def save_and_stop(channel, target_channel=None, session_data=None):
             # 傳送「正在生成摘要」提示 (因為 API 可能需要幾秒鐘)
             processing_msg = await channel.send("🤖 正在呼叫 Gemini 幫您生成懶人包，請稍候……")
             
-            summary_text, used_model = await generate_summary(channel.name, messages)
+            summary_text, used_model, route_reason = await generate_summary(channel.name, messages, channel.guild.id)
             
             if summary_text:
-                summary_content = f"# 🤖 AI 懶人包 - {channel.name}\n\n{summary_text}\n\n---\n*Generated by Google {used_model}*"
+                summary_content = f"# 🤖 AI 懶人包 - {channel.name}\n\n{summary_text}\n\n---\n*Generated by Google {used_model}*\n*路由：{route_reason}*"
                 for fmt in formats_to_create:
                     summary_filename = f"summary_{safe_channel_name}_{timestamp_str}.{fmt}"
                     with open(summary_filename, "w", encoding="utf-8") as f:
@@ -560,10 +715,10 @@ async def summary_cmd(
             
         await interaction.edit_original_response(content=f"🤖 **正在呼叫 Gemini 分析 {len(fetched_messages)} 則對話紀錄，請稍候……**\n{backtrack_summary}{helper_warning}{parsed_time_info}")
         
-        summary_text, used_model = await generate_summary(interaction.channel.name, fetched_messages)
+        summary_text, used_model, route_reason = await generate_summary(interaction.channel.name, fetched_messages, interaction.guild_id)
         
         if summary_text:
-            content = f"# 🤖 AI 直接摘要 - {interaction.channel.name}\n\n{summary_text}\n\n---\n*範圍：{backtrack_summary}（共 {len(fetched_messages)} 則）*\n*模型：{used_model}*"
+            content = f"# 🤖 AI 直接摘要 - {interaction.channel.name}\n\n{summary_text}\n\n---\n*範圍：{backtrack_summary}（共 {len(fetched_messages)} 則）*\n*模型：{used_model}*\n*路由：{route_reason}*"
             
             # 建立檔案
             safe_channel_name = sanitize_filename(interaction.channel.name)
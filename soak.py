@@ -0,0 +1,335 @@
+"""
+攔藍錄壓力測試 (Soak Test) 工具
+
+以合成的 Gateway 流量驅動 main.py 中真正的 on_message、check_timeout、/record 與 /stop，
+模擬 N 個頻道同時錄製、每個頻道每秒 M 則訊息，並以延遲可調的假 Gemini Client 產生摘要。
+執行期間會記錄 Event Loop 延遲、RSS 記憶體成長、「停止 → 匯出」與「訊息進入 → 匯出」的延遲分佈，
+任一指標超過設定門檻時以非零狀態碼結束，方便依實測數據決定容器規格。
+
+Gateway 心跳由 discord.py 的背景執行緒送出，但心跳 ACK 與所有事件都在 Event Loop 上處理，
+因此 Event Loop 延遲即為心跳與 on_message 是否開始落後的指標。
+
+用法：
+    python soak.py --channels 50 --rate 2 --duration 120 --gemini-delay 5
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+# 必須在匯入 main 之前設定，讓摘要流程啟用 (實際呼叫會被替換為假的 Gemini Client)
+os.environ.setdefault('GEMINI_API_KEY', 'soak-test')
+
+import main
+
+# 訊息內容中的追蹤標記，用於從匯出的紀錄檔中找回每則訊息
+TRACE_PATTERN = re.compile(r'soak-(\d+)-(\d+)')
+
+# ===== 假的 Gemini Client =====
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGeminiModels:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def generate_content(self, model, contents):
+        # 與真正的 SDK 相同為同步阻塞呼叫，main.py 會透過 run_in_executor 執行
+        time.sleep(self.delay)
+        return FakeGeminiResponse(f"（壓力測試摘要，模型 {model}，prompt 長度 {len(contents)}）")
+
+class FakeGeminiClient:
+    def __init__(self, delay):
+        self.models = FakeGeminiModels(delay)
+
+# ===== 假的 Discord 物件 =====
+
+class FakePermissions:
+    administrator = True
+
+class FakeUser:
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.bot = False
+        self.guild_permissions = FakePermissions()
+        self.roles = []
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+class FakeSentMessage:
+    async def delete(self):
+        pass
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, stats):
+        self.id = channel_id
+        self.name = f"soak-{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.guild = guild
+        self.stats = stats
+
+    async def send(self, content=None, *, files=None, allowed_mentions=None):
+        if files:
+            self.stats.record_export(self.id, files)
+        elif self.id in main.recording_sessions:
+            # 自動停止 (閒置超時、訊息上限) 在匯出前都會先於頻道發出通知，以此作為停止時間點
+            self.stats.record_stop(self.id)
+        return FakeSentMessage()
+
+    async def history(self, **kwargs):
+        # 壓力測試只驗證即時錄製，不回溯歷史訊息
+        return
+        yield
+
+class FakeMessage:
+    def __init__(self, channel, author, content):
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.attachments = []
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self._state = None
+
+class FakeResponse:
+    async def send_message(self, content=None, *, ephemeral=False):
+        pass
+
+class FakeFollowup:
+    async def send(self, content=None, *, ephemeral=False):
+        print(f"⚠️ 指令回報錯誤：{content}")
+
+class FakeInteraction:
+    def __init__(self, channel, user):
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild_id = channel.guild.id
+        self.user = user
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+    async def edit_original_response(self, content=None, attachments=None):
+        pass
+
+# ===== 指標收集 =====
+
+def percentile(values, pct):
+    """計算百分位數 (最近秩法)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def current_rss_mb() -> float:
+    """取得目前行程的 RSS (MB)，非 Linux 環境退而使用峰值 RSS"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 單位為 bytes，Linux 為 KB
+        return max_rss / 1024 / 1024 if sys.platform == "darwin" else max_rss / 1024
+
+class SoakStats:
+    def __init__(self):
+        self.ingested = {}        # (channel_id, seq) -> 進入 on_message 的時間
+        self.stopped = {}         # channel_id -> 觸發停止的時間
+        self.export_latencies = []
+        self.stop_latencies = []
+        self.exported_count = 0
+        self.export_count = 0
+        self.loop_lags = []
+        self.rss_samples = []
+
+    def record_ingest(self, channel_id, seq):
+        self.ingested[(channel_id, seq)] = time.monotonic()
+
+    def record_stop(self, channel_id):
+        # 同一次停止只記錄最早的時間點 (/stop 之後的提示訊息不覆寫)
+        self.stopped.setdefault(channel_id, time.monotonic())
+
+    def record_export(self, channel_id, files):
+        now = time.monotonic()
+        self.export_count += 1
+        stopped_at = self.stopped.pop(channel_id, None)
+        if stopped_at is not None:
+            self.stop_latencies.append(now - stopped_at)
+        for file in files:
+            try:
+                if not file.filename.startswith("record_"):
+                    continue
+                text = file.fp.read().decode("utf-8")
+                for channel_id, seq in TRACE_PATTERN.findall(text):
+                    ingested_at = self.ingested.pop((int(channel_id), int(seq)), None)
+                    if ingested_at is not None:
+                        self.export_latencies.append(now - ingested_at)
+                        self.exported_count += 1
+            finally:
+                file.close()
+
+# ===== 負載產生 =====
+
+async def monitor_loop_lag(stats, interval, stop_event):
+    """以固定間隔睡眠，量測實際喚醒時間與預期的落差"""
+    while not stop_event.is_set():
+        expected = time.monotonic() + interval
+        await asyncio.sleep(interval)
+        stats.loop_lags.append(max(0.0, time.monotonic() - expected))
+
+async def monitor_rss(stats, interval, stop_event):
+    while not stop_event.is_set():
+        stats.rss_samples.append(current_rss_mb())
+        await asyncio.sleep(interval)
+
+async def drive_check_timeout(interval, stop_event):
+    """壓縮時間軸後定期執行真正的 check_timeout"""
+    while not stop_event.is_set():
+        await asyncio.sleep(interval)
+        await main.check_timeout()
+
+async def drive_channel(channel, user, args, stats, deadline, seq_counter, pending):
+    """單一頻道的錄製循環：/record → 持續發話 → /stop 或閒置超時 → 重複"""
+    interval = 1 / args.rate
+    for cycle in itertools.count():
+        if time.monotonic() >= deadline:
+            break
+
+        await main.record.callback(FakeInteraction(channel, user), summary=not args.no_summary)
+
+        # 以絕對時間排程，避免處理延遲累積成發送速率下降
+        session_end = min(deadline, time.monotonic() + args.session_seconds)
+        next_send = time.monotonic()
+        while time.monotonic() < session_end:
+            seq = next(seq_counter)
+            message = FakeMessage(channel, user, f"soak-{channel.id}-{seq} {'蘭' * args.message_size}")
+            if channel.id in main.recording_sessions:
+                stats.record_ingest(channel.id, seq)
+            # Gateway 會為每個事件建立獨立的 Task，這裡比照辦理
+            pending.add(asyncio.create_task(main.on_message(message)))
+            next_send += interval
+            await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+
+        # 依比例讓部分頻道閒置，交由 check_timeout 自動結束
+        if args.idle_every and cycle % args.idle_every == args.idle_every - 1:
+            while channel.id in main.recording_sessions:
+                await asyncio.sleep(args.check_interval)
+        elif channel.id in main.recording_sessions:
+            stats.record_stop(channel.id)
+            await main.stop.callback(FakeInteraction(channel, user))
+
+async def run_soak(args):
+    stats = SoakStats()
+    main.gemini_client = FakeGeminiClient(args.gemini_delay)
+    main.IDLE_TIMEOUT_MINUTES = args.idle_timeout / 60
+
+    # 模擬 Gateway 的登入身分與頻道快取
+    main.bot._connection.user = FakeUser(0, "lanlanlu")
+    guild = FakeGuild(1)
+    channels = {channel_id: FakeChannel(channel_id, guild, stats) for channel_id in range(100, 100 + args.channels)}
+    main.bot.get_channel = channels.get
+
+    stop_event = asyncio.Event()
+    monitors = [
+        asyncio.create_task(monitor_loop_lag(stats, args.lag_interval, stop_event)),
+        asyncio.create_task(monitor_rss(stats, 1, stop_event)),
+        asyncio.create_task(drive_check_timeout(args.check_interval, stop_event)),
+    ]
+
+    deadline = time.monotonic() + args.duration
+    seq_counter = itertools.count()
+    pending = set()
+    drivers = [
+        asyncio.create_task(drive_channel(channel, FakeUser(channel_id + 10_000, f"user-{channel_id}"), args, stats, deadline, seq_counter, pending))
+        for channel_id, channel in channels.items()
+    ]
+    await asyncio.gather(*drivers)
+
+    # 等待所有訊息處理與匯出完成
+    while True:
+        pending = {task for task in pending if not task.done()}
+        if not pending and not main.recording_sessions:
+            break
+        if pending:
+            await asyncio.wait(pending)
+        else:
+            await asyncio.sleep(args.check_interval)
+
+    stop_event.set()
+    await asyncio.gather(*monitors)
+    return stats
+
+def report(stats, args) -> bool:
+    """輸出測試報告，返回是否通過所有門檻"""
+    lag_ms = [lag * 1000 for lag in stats.loop_lags]
+    rss_growth = stats.rss_samples[-1] - stats.rss_samples[0] if stats.rss_samples else 0.0
+    lost = len(stats.ingested)
+
+    print("===== 攔藍錄壓力測試報告 =====")
+    print(f"頻道數：{args.channels}，每頻道 {args.rate} 則/秒，持續 {args.duration} 秒，Gemini 延遲 {args.gemini_delay} 秒")
+    print(f"Event Loop 延遲 (ms)：p50 {percentile(lag_ms, 50):.1f} / p99 {percentile(lag_ms, 99):.1f} / max {max(lag_ms, default=0):.1f}")
+    print(f"RSS (MB)：起始 {stats.rss_samples[0] if stats.rss_samples else 0:.1f} / 峰值 {max(stats.rss_samples, default=0):.1f} / 成長 {rss_growth:.1f}")
+    if stats.stop_latencies:
+        print(f"停止 → 匯出延遲 (秒)：p50 {percentile(stats.stop_latencies, 50):.2f} / p95 {percentile(stats.stop_latencies, 95):.2f} / "
+              f"p99 {percentile(stats.stop_latencies, 99):.2f} / 平均 {statistics.mean(stats.stop_latencies):.2f}")
+    if stats.export_latencies:
+        # 包含錄製期間的等待時間，僅供參考，門檻以「停止 → 匯出」為準
+        print(f"訊息進入 → 匯出延遲 (秒)：p50 {percentile(stats.export_latencies, 50):.2f} / p95 {percentile(stats.export_latencies, 95):.2f} / "
+              f"p99 {percentile(stats.export_latencies, 99):.2f} / 平均 {statistics.mean(stats.export_latencies):.2f}")
+    print(f"匯出次數：{stats.export_count}，已匯出訊息：{stats.exported_count}，未出現在紀錄檔中的訊息：{lost}")
+
+    failures = []
+    if percentile(lag_ms, 99) > args.max_lag_ms:
+        failures.append(f"Event Loop 延遲 p99 {percentile(lag_ms, 99):.1f} ms 超過門檻 {args.max_lag_ms} ms")
+    if rss_growth > args.max_rss_growth_mb:
+        failures.append(f"RSS 成長 {rss_growth:.1f} MB 超過門檻 {args.max_rss_growth_mb} MB")
+    if percentile(stats.stop_latencies, 95) > args.max_export_p95:
+        failures.append(f"停止 → 匯出延遲 p95 {percentile(stats.stop_latencies, 95):.2f} 秒超過門檻 {args.max_export_p95} 秒")
+    if lost > args.max_lost:
+        failures.append(f"遺失訊息 {lost} 則超過門檻 {args.max_lost} 則")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 所有指標皆在門檻內。")
+    return not failures
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="攔藍錄壓力測試：模擬多頻道同時錄製並量測 Event Loop 延遲、記憶體與匯出延遲")
+    parser.add_argument("--channels", type=int, default=20, help="同時錄製的頻道數 (N)")
+    parser.add_argument("--rate", type=float, default=1.0, help="每個頻道每秒的訊息數 (M)")
+    parser.add_argument("--duration", type=float, default=60, help="產生流量的總秒數")
+    parser.add_argument("--session-seconds", type=float, default=20, help="每次錄製持續發話的秒數")
+    parser.add_argument("--message-size", type=int, default=40, help="每則訊息附加的內文字數")
+    parser.add_argument("--gemini-delay", type=float, default=3.0, help="假 Gemini Client 每次呼叫的延遲秒數")
+    parser.add_argument("--no-summary", action="store_true", help="錄製時關閉 AI 摘要")
+    parser.add_argument("--idle-every", type=int, default=3, help="每幾次錄製讓一次閒置至自動超時 (0 為停用)")
+    parser.add_argument("--idle-timeout", type=float, default=5, help="壓縮後的閒置超時秒數 (取代 IDLE_TIMEOUT_MINUTES)")
+    parser.add_argument("--check-interval", type=float, default=1, help="壓縮後 check_timeout 的執行間隔秒數")
+    parser.add_argument("--lag-interval", type=float, default=0.05, help="Event Loop 延遲取樣間隔秒數")
+    parser.add_argument("--max-lag-ms", type=float, default=200, help="Event Loop 延遲 p99 門檻 (毫秒)")
+    parser.add_argument("--max-rss-growth-mb", type=float, default=200, help="RSS 成長門檻 (MB)")
+    parser.add_argument("--max-export-p95", type=float, default=60, help="停止 (/stop、閒置超時或訊息上限) → 匯出延遲 p95 門檻 (秒)")
+    parser.add_argument("--max-lost", type=int, default=0, help="未出現在紀錄檔中的訊息數門檻")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    # 在暫存目錄中執行，避免匯出檔案與 config.json 影響專案目錄
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        stats = asyncio.run(run_soak(args))
+    sys.exit(0 if report(stats, args) else 1)